@@ -1,171 +1,649 @@
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response
 from dotenv import load_dotenv
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from slowapi.util import get_remote_address
 import httpx
+import orjson
+import asyncio
+import uuid
+import redis.asyncio as redis
+from contextlib import asynccontextmanager
+from cachetools import LRUCache, TTLCache
 import os
-from time import time
+from time import monotonic, time
 import logging
-from decimal import Decimal, getcontext
-from typing import Dict, List, Optional
+import logging.handlers
+import queue
+import random
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+from datetime import datetime
+
+T = TypeVar("T")
 
 # === Configuration Setup ===
 load_dotenv()
-getcontext().prec = 8
 
 @dataclass
 class AppConfig:
     CACHE_TTL: int = int(os.getenv("CACHE_TTL_SECONDS", 300))
+    STALE_GRACE: int = int(os.getenv("STALE_GRACE_SECONDS", 60))  # Serve expired prices this long while refreshing
     DEFAULT_QUOTE: str = os.getenv("DEFAULT_QUOTE", "USDT").upper()
     COINGECKO_LIST_TTL: int = int(os.getenv("COINGECKO_LIST_TTL", 86400))
-    FAILURE_TTL: int = int(os.getenv("FAILURE_TTL", 600))
+    COINGECKO_LIST_RETRY: int = int(os.getenv("COINGECKO_LIST_RETRY", 60))  # Pause after a failed download
+    FAILURE_TTL: int = int(os.getenv("FAILURE_TTL", 600))  # How long an open circuit skips a source
+    BREAKER_THRESHOLD: int = max(1, int(os.getenv("BREAKER_THRESHOLD", 3)))  # Consecutive failures that open it
     INTERMEDIATE_SYMBOL: str = os.getenv("INTERMEDIATE_SYMBOL", "USDT").upper()
     HTTP_TIMEOUT: int = int(os.getenv("HTTP_TIMEOUT", 5))
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "WARNING").upper()
+    HTTP_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", 2))
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", 1000))
+    HTTP_MAX_KEEPALIVE: int = int(os.getenv("HTTP_MAX_KEEPALIVE", 100))
+    SOURCE_TIMEOUT: float = float(os.getenv("SOURCE_TIMEOUT", 1.5))
+    HEDGE_DELAY: float = float(os.getenv("HEDGE_DELAY", 0.5))
+    RETRY_ATTEMPTS: int = max(1, int(os.getenv("RETRY_ATTEMPTS", 3)))
+    RETRY_BACKOFF: float = float(os.getenv("RETRY_BACKOFF", 0.1))  # Upper bound of the first retry delay
+    BATCH_WINDOW: float = float(os.getenv("BATCH_WINDOW", 0.01))  # Seconds to gather calls into one batch
+    MIN_SOURCES: int = int(os.getenv("MIN_SOURCES", 2))  # 0 waits for every exchange
+    PRICE_CACHE_SIZE: int = int(os.getenv("PRICE_CACHE_SIZE", 50000))
+    FAILURE_CACHE_SIZE: int = int(os.getenv("FAILURE_CACHE_SIZE", 50000))
+    COIN_ID_CACHE_SIZE: int = int(os.getenv("COIN_ID_CACHE_SIZE", 20000))
+    REDIS_URL: Optional[str] = os.getenv("REDIS_URL") or None
+    SINGLE_FLIGHT_TTL: int = int(os.getenv("SINGLE_FLIGHT_TTL", 10))
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", 10000))
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", 1))  # Bounds how far a served body can lag
+    BREAKER_MAX_COOLDOWN: int = int(os.getenv("BREAKER_MAX_COOLDOWN", 3600))  # Cap for the doubling cooldown
+    CLIENT_RATE_LIMIT: str = os.getenv("CLIENT_RATE_LIMIT", "30/second")
+    HOT_PAIRS_LIMIT: int = int(os.getenv("HOT_PAIRS_LIMIT", 50))
+    HOT_PAIR_IDLE_TTL: int = int(os.getenv("HOT_PAIR_IDLE_TTL", 3600))
 
 config = AppConfig()
 
 # === Logging Setup ===
+# Records are queued here and written by a listener thread, so the event loop never blocks on stdout
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+log_output = logging.StreamHandler()
+log_output.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, log_output)
 logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    level=config.LOG_LEVEL,
+    format='%(message)s',  # The listener's handler applies the real format
+    handlers=[logging.handlers.QueueHandler(log_queue)]
 )
 logger = logging.getLogger(__name__)
 
 # === Data Models ===
-@dataclass
+# Slotted: one of these is created per fetch and kept in every price cache
+@dataclass(slots=True)
 class PriceResult:
     source: str
     price: float
     base_asset: str
     quote_asset: str
     inverted: bool = False
-    timestamp: float = field(default_factory=time)
+    timestamp: float = field(default_factory=time)  # Wall clock: shared with other workers and rendered as expires_at
     original_price: Optional[float] = None
-    
-    @property
-    def expires_in(self) -> float:
-        """Calculates remaining cache time in seconds"""
-        return max(0, config.CACHE_TTL - (time() - self.timestamp))
-    
-    @property
-    def expires_at(self) -> datetime:
-        """Returns datetime when this price expires"""
-        return datetime.now() + timedelta(seconds=self.expires_in)
-    
+    expires_ts: float = field(default=0.0, init=False)  # Absolute expiry (wall clock), set once at creation
+    _expires_iso: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.expires_ts = self.timestamp + config.CACHE_TTL
+
+    def remaining(self, now: float) -> float:
+        """Remaining cache time in seconds as of now (a time() value)"""
+        return max(0, self.expires_ts - now)
+
+    def expires_at_iso(self, now: float) -> str:
+        """ISO time when this price expires (now once it is stale); the string is fixed until
+        the price goes stale, so it is built once"""
+        if now >= self.expires_ts:
+            return datetime.fromtimestamp(now).isoformat()
+        if self._expires_iso is None:
+            self._expires_iso = datetime.fromtimestamp(self.expires_ts).isoformat()
+        return self._expires_iso
+
     @property
     def pair(self) -> str:
         """Returns the trading pair in standard format"""
         return f"{self.base_asset}/{self.quote_asset}"
 
-@dataclass
+@dataclass(slots=True)
 class DerivedPriceResult(PriceResult):
     components: List[PriceResult] = field(default_factory=list)
-    
-    @property
-    def expires_in(self) -> float:
-        """Calculates remaining cache time based on component with shortest expiry"""
-        if not self.components:
-            return config.CACHE_TTL
-        return min(comp.expires_in for comp in self.components)
+
+    def __post_init__(self):
+        # Expires with the component that expires first. Explicit base call: zero-argument
+        # super() does not work in slots=True dataclasses
+        PriceResult.__post_init__(self)
+        if self.components:
+            self.expires_ts = min(comp.expires_ts for comp in self.components)
+
+def best_price(prices: List[PriceResult]) -> PriceResult:
+    """Returns the highest price (first one on ties) in a single pass without a key callback"""
+    best = prices[0]
+    for p in prices:
+        if p.price > best.price:
+            best = p
+    return best
 
 # === Cache System ===
+# Cache keys are plain (source, base, quote) tuples built inline. Callers pass normalized values:
+# lowercase exchange NAMEs and the uppercase symbols produced once by the /price handler.
+
+@dataclass
+class CircuitBreaker:
+    """Per (source, base, quote) breaker. Closed until BREAKER_THRESHOLD consecutive failures,
+    then open for FAILURE_TTL seconds; after that a single half-open probe either closes it
+    (success) or opens it again with the cooldown doubled, up to BREAKER_MAX_COOLDOWN, so a
+    source that never lists a pair is asked less and less often."""
+    failures: int = 0
+    opened_at: Optional[float] = None  # monotonic() when last opened or probed; None while closed
+    cooldown: float = 0.0
+
 class PriceCache:
     def __init__(self):
-        self.price_data: Dict[str, PriceResult] = {}
-        self.coin_ids: Dict[str, str] = {}
-        self.failures: Dict[str, float] = {}
-        self.coingecko_list: List[Dict] = []
+        # Bounded caches: entries expire after their TTL and the least recently used are evicted first
+        self.price_data: TTLCache = TTLCache(maxsize=config.PRICE_CACHE_SIZE, ttl=config.CACHE_TTL + config.STALE_GRACE)
+        # Resolved ids (None for symbols CoinGecko does not list) expire with the coin list they came from
+        self.coin_ids: TTLCache = TTLCache(maxsize=config.COIN_ID_CACHE_SIZE, ttl=config.COINGECKO_LIST_TTL)
+        self.breakers: LRUCache = LRUCache(maxsize=config.FAILURE_CACHE_SIZE)
+        self.coingecko_symbol_index: Dict[str, List[str]] = {}  # symbol -> ids, in listing order
         self.coingecko_list_last_updated: float = 0
-
-    def _make_key(self, source: str, base: str, quote: str) -> str:
-        return f"{source.lower()}_{base.upper()}_{quote.upper()}"
+        self.coingecko_list_refresh: Optional[asyncio.Future] = None  # Last on-demand download, shared by its callers
+        self.coingecko_list_failed_at: Optional[float] = None
+        self.hot_pairs: Dict[Tuple[str, str], float] = {}
+        self.refreshing: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Encoded /price bodies, served as-is for RESPONSE_CACHE_TTL
+        self.rendered: TTLCache = TTLCache(maxsize=config.RESPONSE_CACHE_SIZE, ttl=config.RESPONSE_CACHE_TTL)
+        self.in_flight: Dict[Tuple[str, str, Optional[str], Optional[str], bool], asyncio.Future] = {}
+        # Single-exchange fetches in progress, keyed like price_data
+        self.fetches_in_flight: Dict[Tuple[str, str, str], asyncio.Future] = {}
 
     def get_price(self, source: str, base: str, quote: str) -> Optional[PriceResult]:
-        key = self._make_key(source, base, quote)
-        result = self.price_data.get(key)
-        if result and result.expires_in > 0:
-            return result
-        return None
+        return self.price_data.get((source, base, quote))
 
     def set_price(self, result: PriceResult) -> None:
-        key = self._make_key(result.source, result.base_asset, result.quote_asset)
+        key = (result.source, result.base_asset, result.quote_asset)
         self.price_data[key] = result
 
-    def is_failure_cached(self, source: str, base: str, quote: str) -> bool:
-        key = self._make_key(source, base, quote)
-        failure_time = self.failures.get(key, 0)
-        return (time() - failure_time) < config.FAILURE_TTL
+    def expire(self) -> None:
+        """Drops expired entries; TTLCaches otherwise only purge them lazily on writes"""
+        for ttl_cache in (self.price_data, self.coin_ids, self.rendered):
+            ttl_cache.expire()
+
+    def is_circuit_open(self, source: str, base: str, quote: str) -> bool:
+        """True while the source is cooling down and should be skipped"""
+        breaker = self.breakers.get((source, base, quote))
+        return (breaker is not None and breaker.opened_at is not None
+                and monotonic() - breaker.opened_at < breaker.cooldown)
 
-    def cache_failure(self, source: str, base: str, quote: str) -> None:
-        key = self._make_key(source, base, quote)
-        self.failures[key] = time()
+    def start_fetch(self, source: str, base: str, quote: str) -> bool:
+        """Called right before a fetch is sent; False if the circuit is open. Once the cooldown is
+        over, the first caller gets True (the half-open probe) and the cooldown restarts, so no one
+        else probes meanwhile. Claiming here rather than while picking sources means a source that
+        ends up not being queried keeps its probe for the next request."""
+        if self.is_circuit_open(source, base, quote):
+            return False
+        breaker = self.breakers.get((source, base, quote))
+        if breaker is not None and breaker.opened_at is not None:
+            breaker.opened_at = monotonic()
+        return True
+
+    def record_failure(self, source: str, base: str, quote: str) -> bool:
+        """Counts a failed fetch; returns True if it opened (or re-opened) the circuit"""
+        key = (source, base, quote)
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            breaker = self.breakers[key] = CircuitBreaker()
+        breaker.failures += 1
+        if breaker.opened_at is not None:
+            # A failed half-open probe re-opens straight away, for twice as long
+            breaker.cooldown = min(breaker.cooldown * 2, max(config.FAILURE_TTL, config.BREAKER_MAX_COOLDOWN))
+        elif breaker.failures >= config.BREAKER_THRESHOLD:
+            breaker.cooldown = config.FAILURE_TTL
+        else:
+            return False
+        breaker.opened_at = monotonic()
+        return True
+
+    def close_circuit(self, source: str, base: str, quote: str) -> None:
+        self.breakers.pop((source, base, quote), None)
+
+    def track_hot_pair(self, base: str, quote: str) -> None:
+        """Remembers a requested pair so the background refresher keeps it warm"""
+        pair = (base, quote)
+        # Re-insert so the dict stays ordered from least to most recently requested
+        self.hot_pairs.pop(pair, None)
+        self.hot_pairs[pair] = monotonic()
+        while len(self.hot_pairs) > config.HOT_PAIRS_LIMIT:
+            del self.hot_pairs[next(iter(self.hot_pairs))]
+
+    def get_hot_pairs(self) -> List[Tuple[str, str]]:
+        """Returns tracked pairs, dropping those not requested within HOT_PAIR_IDLE_TTL"""
+        cutoff = monotonic() - config.HOT_PAIR_IDLE_TTL
+        for pair in [p for p, requested_at in self.hot_pairs.items() if requested_at < cutoff]:
+            del self.hot_pairs[pair]
+        return list(self.hot_pairs)
 
 cache = PriceCache()
 
+class SharedPriceStore:
+    """Redis-backed price store shared by every worker process; a no-op unless REDIS_URL is set"""
+
+    def __init__(self):
+        self.redis: Optional[redis.Redis] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None
+
+    def connect(self, url: Optional[str]) -> None:
+        if url:
+            self.redis = redis.from_url(url)
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+    @staticmethod
+    def _key(source: str, base: str, quote: str) -> str:
+        return f"px:{source}:{base}:{quote}"
+
+    @staticmethod
+    def _failure_key(source: str, base: str, quote: str) -> str:
+        return f"px:fail:{source}:{base}:{quote}"
+
+    @staticmethod
+    def _encode(result: PriceResult) -> bytes:
+        """Stores the plain fields only: nothing read back from Redis is ever executed"""
+        return orjson.dumps({
+            "source": result.source,
+            "price": result.price,
+            "base_asset": result.base_asset,
+            "quote_asset": result.quote_asset,
+            "inverted": result.inverted,
+            "timestamp": result.timestamp,
+            "original_price": result.original_price,
+        })
+
+    @staticmethod
+    def _decode(data: Optional[bytes]) -> Optional[PriceResult]:
+        if not data:
+            return None
+        try:
+            return PriceResult(**orjson.loads(data))
+        except (orjson.JSONDecodeError, TypeError) as e:
+            # E.g. an entry written in an older format; it expires within CACHE_TTL
+            logger.warning("Ignoring unreadable shared cache entry: %s", e)
+            return None
+
+    async def get_price(self, source: str, base: str, quote: str) -> Optional[PriceResult]:
+        if self.redis is None:
+            return None
+        try:
+            data = await self.redis.get(self._key(source, base, quote))
+            return self._decode(data)
+        except Exception as e:
+            logger.warning("Shared cache read failed for %s %s/%s: %s", source, base, quote, e)
+            return None
+
+    async def get_many(self, sources: List[str], base: str, quote: str) -> Tuple[List[Optional[PriceResult]], List[bool]]:
+        """Reads the cached price and failure marker of several sources in a single MGET round trip"""
+        if self.redis is None:
+            return [None] * len(sources), [False] * len(sources)
+        keys = [self._key(source, base, quote) for source in sources]
+        keys += [self._failure_key(source, base, quote) for source in sources]
+        try:
+            values = await self.redis.mget(keys)
+        except Exception as e:
+            logger.warning("Shared cache read failed for %s/%s: %s", base, quote, e)
+            return [None] * len(sources), [False] * len(sources)
+        prices, failures = values[:len(sources)], values[len(sources):]
+        return [self._decode(data) for data in prices], [data is not None for data in failures]
+
+    async def set_price(self, result: PriceResult) -> None:
+        """Stores a fetched price and clears the source's failure marker, so other workers
+        stop skipping a source as soon as one of them has a price from it again"""
+        if self.redis is None:
+            return
+        try:
+            args = (result.source, result.base_asset, result.quote_asset)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(self._key(*args), self._encode(result), ex=config.CACHE_TTL)
+                pipe.delete(self._failure_key(*args))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Shared cache write failed for %s %s: %s", result.source, result.pair, e)
+
+    async def cache_failure(self, source: str, base: str, quote: str) -> None:
+        if self.redis is None:
+            return
+        try:
+            # Set when a circuit opens. NX: the first worker to open it starts the window; later ones don't extend it
+            await self.redis.set(self._failure_key(source, base, quote), 1, nx=True, ex=config.FAILURE_TTL)
+        except Exception as e:
+            logger.warning("Shared cache write failed for %s %s/%s: %s", source, base, quote, e)
+
+    @asynccontextmanager
+    async def single_flight(self, name: str) -> AsyncIterator[None]:
+        """Lets one worker at a time fetch a pair; the others wait for it to finish
+        (up to SINGLE_FLIGHT_TTL) before going on"""
+        if self.redis is None:
+            yield
+            return
+
+        lock_key = f"px:lock:{name}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis.set(lock_key, token, nx=True, ex=config.SINGLE_FLIGHT_TTL)
+        except Exception as e:
+            logger.warning("Shared cache lock failed for %s: %s", name, e)
+            yield
+            return
+
+        if not acquired:
+            deadline = monotonic() + config.SINGLE_FLIGHT_TTL
+            try:
+                while monotonic() < deadline and await self.redis.exists(lock_key):
+                    await asyncio.sleep(0.05)
+            except Exception as e:
+                logger.warning("Shared cache lock wait failed for %s: %s", name, e)
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            try:
+                if await self.redis.get(lock_key) == token.encode():
+                    await self.redis.delete(lock_key)
+            except Exception as e:
+                logger.warning("Shared cache unlock failed for %s: %s", name, e)
+
+shared_cache = SharedPriceStore()
+
+# === Rate Limiting ===
+class ThrottleTimeout(Exception):
+    """No concurrency slot or rate-limit token was free in time. This is local back-pressure,
+    not an upstream failure, so it never counts against the source."""
+
+class RateLimiter:
+    """Token bucket allowing `rate` requests per second with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self.lock:
+            while True:
+                now = monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# === Request Batching ===
+class Coalescer:
+    """Collects keys requested within BATCH_WINDOW seconds and resolves them with a single
+    fetch_batch(client, keys) call. fetch_batch returns a value (or exception) per key;
+    keys it leaves out resolve to None."""
+
+    def __init__(self, fetch_batch: Callable[[httpx.AsyncClient, list], Awaitable[dict]]):
+        self.fetch_batch = fetch_batch
+        self.pending: Dict[Tuple, asyncio.Future] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+
+    async def get(self, client: httpx.AsyncClient, key: Tuple):
+        future = self.pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.pending[key] = future
+            if self.flush_task is None:
+                self.flush_task = asyncio.ensure_future(self._flush_after_window(client))
+        # Shielded so one cancelled caller does not fail the key for everyone waiting on it
+        return await asyncio.shield(future)
+
+    async def _flush_after_window(self, client: httpx.AsyncClient) -> None:
+        await asyncio.sleep(config.BATCH_WINDOW)
+        batch, self.pending, self.flush_task = self.pending, {}, None
+        try:
+            results = await self.fetch_batch(client, list(batch))
+        except Exception as e:
+            results = {key: e for key in batch}
+
+        for key, future in batch.items():
+            if future.done():
+                continue
+            outcome = results.get(key)
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+# === Request Hedging ===
+async def hedged(first: Awaitable[T], second: Callable[[], Awaitable[T]], delay: float) -> T:
+    """Awaits first, starting second() if first is still pending after `delay` seconds.
+    The first attempt to succeed wins and the other is cancelled; if both fail, the error
+    of the last one is raised."""
+    tasks = {asyncio.ensure_future(first)}
+    try:
+        done, tasks = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return done.pop().result()
+
+        tasks.add(asyncio.ensure_future(second()))
+        while True:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            if not tasks:
+                return task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+
 # === Exchange Interfaces ===
+# What a fetcher treats as "no price here": HTTP errors, unexpected payload shapes, unparsable numbers.
+# ThrottleTimeout is deliberately not one of them and reaches _fetch_and_cache.
+FETCH_ERRORS = (httpx.HTTPError, LookupError, StopIteration, TypeError, ValueError, ArithmeticError)
+
 class ExchangeBase:
     NAME = "base"
     PRIORITY = 0
+    TIMEOUT: float = config.SOURCE_TIMEOUT
+    HEDGE_DELAY: Optional[float] = None  # Send a second request if the first has not answered after this many seconds
+    CONCURRENCY = 10  # Max simultaneous requests, overridable with <NAME>_CONCURRENCY
+    RATE_LIMIT: float = 10  # Requests per second, overridable with <NAME>_RPS (0 disables)
+    PRICE_URL = ""  # Ticker URL template, filled with (base, quote) using %
+
+    # Created on first use so they bind to the running event loop
+    _throttles: Dict[str, Tuple[asyncio.Semaphore, RateLimiter]] = {}
+
+    @classmethod
+    def _throttle(cls) -> Tuple[asyncio.Semaphore, RateLimiter]:
+        throttle = ExchangeBase._throttles.get(cls.NAME)
+        if throttle is None:
+            concurrency = int(os.getenv(f"{cls.NAME.upper()}_CONCURRENCY", cls.CONCURRENCY))
+            rate = float(os.getenv(f"{cls.NAME.upper()}_RPS", cls.RATE_LIMIT))
+            throttle = (asyncio.Semaphore(concurrency), RateLimiter(rate, burst=concurrency))
+            ExchangeBase._throttles[cls.NAME] = throttle
+        return throttle
+
+    @classmethod
+    async def _acquire(cls) -> asyncio.Semaphore:
+        """Waits up to TIMEOUT seconds for a concurrency slot and a rate-limit token and returns
+        the semaphore to release afterwards. Running out of time raises ThrottleTimeout instead of
+        stalling the request behind the queue."""
+        semaphore, limiter = cls._throttle()
+
+        async def acquire() -> None:
+            await semaphore.acquire()
+            try:
+                await limiter.acquire()
+            except BaseException:
+                semaphore.release()
+                raise
+
+        try:
+            await asyncio.wait_for(acquire(), cls.TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ThrottleTimeout(f"no {cls.NAME} request slot within {cls.TIMEOUT}s") from None
+        return semaphore
+
+    @classmethod
+    async def _request(cls, client: httpx.AsyncClient, url: str, timeout, hedge: bool) -> httpx.Response:
+        """Sends one GET within the exchange's concurrency and rate limits. With hedge, a second
+        request follows if the first has not answered HEDGE_DELAY seconds after it was sent; the
+        timer starts once the slot and token are granted, so local queueing never sets it off."""
+        semaphore = await cls._acquire()
+        try:
+            request = client.get(url, timeout=timeout)
+            if hedge:
+                return await hedged(request, lambda: cls._request(client, url, timeout, False), cls.HEDGE_DELAY)
+            return await request
+        finally:
+            semaphore.release()
+
+    @classmethod
+    async def _get(cls, client: httpx.AsyncClient, url: str, timeout=None, hedge: bool = True) -> httpx.Response:
+        """GETs an exchange URL within the exchange's concurrency and rate limits, hedged after
+        HEDGE_DELAY unless hedge=False. Hedging the request rather than fetch_price keeps a batched
+        key from being queued twice, and a hedge still waiting for its turn when the first request
+        answers is cancelled unsent. Transport errors and 5xx responses are retried with jittered
+        exponential backoff; other responses are returned as-is for the caller to check."""
+        if timeout is None:
+            timeout = cls.TIMEOUT
+        hedge = hedge and cls.HEDGE_DELAY is not None
+        for attempt in range(config.RETRY_ATTEMPTS):
+            last_attempt = attempt == config.RETRY_ATTEMPTS - 1
+            try:
+                response = await cls._request(client, url, timeout, hedge)
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code < 500 or last_attempt:
+                    return response
+            await asyncio.sleep(random.uniform(0, config.RETRY_BACKOFF * 2 ** attempt))
+
+    @staticmethod
+    def _json(response: httpx.Response):
+        """Decodes a response body with orjson rather than httpx's stdlib json"""
+        return orjson.loads(response.content)
 
     @classmethod
     async def fetch_price(cls, client: httpx.AsyncClient, base: str, quote: str) -> Optional[PriceResult]:
+        """Fetches base/quote from the exchange. Symbols must already be uppercase;
+        fetchers use them as-is and never re-normalize."""
         raise NotImplementedError
 
 class BinanceExchange(ExchangeBase):
     NAME = "binance"
     PRIORITY = 1
+    CONCURRENCY = 20
+    RATE_LIMIT = 20
+    TICKER_URL = "https://api.binance.com/api/v3/ticker/price"
+    PRICE_URL = TICKER_URL + "?symbol=%s%s"
+
+    @classmethod
+    async def _fetch_single(cls, client: httpx.AsyncClient, base: str, quote: str) -> PriceResult:
+        url = cls.PRICE_URL % (base, quote)
+        response = await cls._get(client, url)
+        response.raise_for_status()
+        data = cls._json(response)
+        return PriceResult(
+            source=cls.NAME,
+            price=float(data["price"]),
+            base_asset=base,
+            quote_asset=quote
+        )
+
+    @classmethod
+    async def fetch_batch(cls, client: httpx.AsyncClient, pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], object]:
+        """Prices several pairs with one ticker call. Binance rejects the whole batch if any
+        symbol is unknown, in which case each pair is fetched on its own."""
+        if len(pairs) > 1:
+            symbols = {f"{base}{quote}": (base, quote) for base, quote in pairs}
+            url = httpx.URL(cls.TICKER_URL,
+                            params={"symbols": orjson.dumps(list(symbols)).decode()})
+            response = await cls._get(client, str(url))
+            if response.status_code == 200:
+                results: Dict[Tuple[str, str], object] = {}
+                for ticker in cls._json(response):
+                    base, quote = symbols[ticker["symbol"]]
+                    results[(base, quote)] = PriceResult(
+                        source=cls.NAME,
+                        price=float(ticker["price"]),
+                        base_asset=base,
+                        quote_asset=quote
+                    )
+                return results
+
+        outcomes = await asyncio.gather(
+            *(cls._fetch_single(client, base, quote) for base, quote in pairs),
+            return_exceptions=True
+        )
+        return dict(zip(pairs, outcomes))
 
     @classmethod
     async def fetch_price(cls, client: httpx.AsyncClient, base: str, quote: str) -> Optional[PriceResult]:
         try:
-            url = f"https://api.binance.com/api/v3/ticker/price?symbol={base}{quote}"
-            response = await client.get(url)
-            response.raise_for_status()
-            data = response.json()
-            return PriceResult(
-                source=cls.NAME,
-                price=float(data["price"]),
-                base_asset=base,
-                quote_asset=quote
-            )
-        except Exception as e:
-            logger.warning(f"{cls.NAME} error for {base}/{quote}: {str(e)}")
+            return await binance_batcher.get(client, (base, quote))
+        except FETCH_ERRORS as e:
+            logger.warning("%s error for %s/%s: %s", cls.NAME, base, quote, e)
             return None
 
+binance_batcher = Coalescer(BinanceExchange.fetch_batch)
+
 class OKXExchange(ExchangeBase):
     NAME = "okx"
     PRIORITY = 2
+    PRICE_URL = "https://www.okx.com/api/v5/market/ticker?instId=%s-%s"
 
     @classmethod
     async def fetch_price(cls, client: httpx.AsyncClient, base: str, quote: str) -> Optional[PriceResult]:
         try:
-            url = f"https://www.okx.com/api/v5/market/ticker?instId={base}-{quote}"
-            response = await client.get(url)
+            url = cls.PRICE_URL % (base, quote)
+            response = await cls._get(client, url)
             response.raise_for_status()
-            data = response.json()
+            data = cls._json(response)
             return PriceResult(
                 source=cls.NAME,
                 price=float(data["data"][0]["last"]),
                 base_asset=base,
                 quote_asset=quote
             )
-        except Exception as e:
-            logger.warning(f"{cls.NAME} error for {base}/{quote}: {str(e)}")
+        except FETCH_ERRORS as e:
+            logger.warning("%s error for %s/%s: %s", cls.NAME, base, quote, e)
             return None
 
 class KrakenExchange(ExchangeBase):
     NAME = "kraken"
     PRIORITY = 3
+    CONCURRENCY = 5
+    RATE_LIMIT = 1  # Public endpoints allow roughly one call per second
+    PRICE_URL = "https://api.kraken.com/0/public/Ticker?pair=%s%s"
 
     @classmethod
     async def fetch_price(cls, client: httpx.AsyncClient, base: str, quote: str) -> Optional[PriceResult]:
         try:
-            pair = f"{base}{quote}"
-            url = f"https://api.kraken.com/0/public/Ticker?pair={pair}"
-            response = await client.get(url)
+            url = cls.PRICE_URL % (base, quote)
+            response = await cls._get(client, url)
             response.raise_for_status()
-            data = response.json()
+            data = cls._json(response)
             ticker = next(iter(data["result"].values()))
             return PriceResult(
                 source=cls.NAME,
@@ -173,102 +651,193 @@ class KrakenExchange(ExchangeBase):
                 base_asset=base,
                 quote_asset=quote
             )
-        except Exception as e:
-            logger.warning(f"{cls.NAME} error for {base}/{quote}: {str(e)}")
+        except FETCH_ERRORS as e:
+            logger.warning("%s error for %s/%s: %s", cls.NAME, base, quote, e)
             return None
 
 class CoinbaseExchange(ExchangeBase):
     NAME = "coinbase"
     PRIORITY = 4
+    PRICE_URL = "https://api.coinbase.com/v2/prices/%s-%s/spot"
 
     @classmethod
     async def fetch_price(cls, client: httpx.AsyncClient, base: str, quote: str) -> Optional[PriceResult]:
         try:
             # Try direct pair first
-            url = f"https://api.coinbase.com/v2/prices/{base}-{quote}/spot"
-            response = await client.get(url)
+            url = cls.PRICE_URL % (base, quote)
+            response = await cls._get(client, url)
             response.raise_for_status()
-            data = response.json()
+            data = cls._json(response)
             return PriceResult(
                 source=cls.NAME,
                 price=float(data["data"]["amount"]),
                 base_asset=base,
                 quote_asset=quote
             )
-        except Exception as e:
-            logger.warning(f"{cls.NAME} direct pair error for {base}/{quote}: {str(e)}")
+        except FETCH_ERRORS as e:
+            logger.warning("%s direct pair error for %s/%s: %s", cls.NAME, base, quote, e)
             # Try inverted pair if direct fails
             try:
-                url = f"https://api.coinbase.com/v2/prices/{quote}-{base}/spot"
-                response = await client.get(url)
+                url = cls.PRICE_URL % (quote, base)
+                response = await cls._get(client, url)
                 response.raise_for_status()
-                data = response.json()
+                data = cls._json(response)
                 inverted_price = float(data["data"]["amount"])
                 if inverted_price != 0:
                     return PriceResult(
                         source=cls.NAME,
-                        price=float(Decimal(1) / Decimal(inverted_price)),
+                        price=1.0 / inverted_price,
                         inverted=True,
                         original_price=inverted_price,
                         base_asset=base,
                         quote_asset=quote
                     )
                 return None
-            except Exception as e:
-                logger.warning(f"{cls.NAME} inverted pair error for {quote}/{base}: {str(e)}")
+            except FETCH_ERRORS as e:
+                logger.warning("%s inverted pair error for %s/%s: %s", cls.NAME, quote, base, e)
                 return None
 
 class MEXCExchange(ExchangeBase):
     NAME = "mexc"
     PRIORITY = 5
+    PRICE_URL = "https://api.mexc.com/api/v3/ticker/price?symbol=%s%s"
 
     @classmethod
     async def fetch_price(cls, client: httpx.AsyncClient, base: str, quote: str) -> Optional[PriceResult]:
         try:
-            url = f"https://api.mexc.com/api/v3/ticker/price?symbol={base}{quote}"
-            response = await client.get(url)
+            url = cls.PRICE_URL % (base, quote)
+            response = await cls._get(client, url)
             response.raise_for_status()
-            data = response.json()
+            data = cls._json(response)
             return PriceResult(
                 source=cls.NAME,
                 price=float(data["price"]),
                 base_asset=base,
                 quote_asset=quote
             )
-        except Exception as e:
-            logger.warning(f"{cls.NAME} error for {base}/{quote}: {str(e)}")
+        except FETCH_ERRORS as e:
+            logger.warning("%s error for %s/%s: %s", cls.NAME, base, quote, e)
             return None
 
 class CoinGeckoExchange(ExchangeBase):
     NAME = "coingecko"
     PRIORITY = 6  # Lowest priority
+    HEDGE_DELAY = config.HEDGE_DELAY  # Response times vary the most here
+    CONCURRENCY = 5
+    RATE_LIMIT = 0.5  # Free tier allows ~30 calls per minute
+    COIN_LIST_URL = "https://api.coingecko.com/api/v3/coins/list"
+    SIMPLE_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
     
+    @classmethod
+    async def refresh_coin_list(cls, client: httpx.AsyncClient) -> bool:
+        """Downloads the CoinGecko coin list and rebuilds the symbol index"""
+        try:
+            # Large payload, so keep the client-wide timeout rather than the per-source one,
+            # and never download it twice
+            response = await cls._get(client, cls.COIN_LIST_URL,
+                                      timeout=httpx.USE_CLIENT_DEFAULT, hedge=False)
+            response.raise_for_status()
+            # Only the symbol index is kept; symbols shared by several coins keep every id
+            symbol_index: Dict[str, List[str]] = {}
+            for coin in cls._json(response):
+                symbol_index.setdefault(coin["symbol"].lower(), []).append(coin["id"])
+            cache.coingecko_symbol_index = symbol_index
+            cache.coingecko_list_last_updated = monotonic()
+            cache.coingecko_list_failed_at = None
+            # Cached misses may be listed now
+            for symbol in [s for s, coin_id in cache.coin_ids.items() if coin_id is None]:
+                cache.coin_ids.pop(symbol, None)
+            return True
+        except FETCH_ERRORS + (ThrottleTimeout,) as e:
+            logger.warning("Failed to fetch CoinGecko coin list: %s", e)
+            cache.coingecko_list_failed_at = monotonic()
+            return False
+
+    @staticmethod
+    def _coin_list_stale() -> bool:
+        return (not cache.coingecko_symbol_index or
+                (monotonic() - cache.coingecko_list_last_updated) > config.COINGECKO_LIST_TTL)
+
+    @classmethod
+    async def _ensure_coin_list(cls, client: httpx.AsyncClient) -> bool:
+        """Refreshes the coin list if it is missing or expired. Concurrent callers share the result
+        of one download and wait at most HTTP_TIMEOUT for it; after a failed download none is tried
+        again for COINGECKO_LIST_RETRY seconds. Meanwhile an expired list, if any, stays in use."""
+        if not cls._coin_list_stale():
+            return True
+        have_list = bool(cache.coingecko_symbol_index)
+        failed_at = cache.coingecko_list_failed_at
+        if failed_at is not None and monotonic() - failed_at < config.COINGECKO_LIST_RETRY:
+            return have_list
+
+        task = cache.coingecko_list_refresh
+        if task is None or task.done():
+            task = cache.coingecko_list_refresh = asyncio.ensure_future(cls.refresh_coin_list(client))
+        try:
+            # Shielded so a caller giving up does not cancel the download for the others
+            return await asyncio.wait_for(asyncio.shield(task), config.HTTP_TIMEOUT) or have_list
+        except asyncio.TimeoutError:
+            return have_list
+
     @classmethod
     async def fetch_coin_id(cls, client: httpx.AsyncClient, symbol: str) -> Optional[str]:
         symbol = symbol.lower()
         if symbol in cache.coin_ids:
             return cache.coin_ids[symbol]
 
-        if (not cache.coingecko_list or 
-            (time() - cache.coingecko_list_last_updated) > config.COINGECKO_LIST_TTL):
+        if not await cls._ensure_coin_list(client):
+            return None
+
+        # Misses are cached too (as None), so unknown symbols skip the index until the list expires
+        candidates = cache.coingecko_symbol_index.get(symbol)
+        if not candidates:
+            cache.coin_ids[symbol] = None
+            return None
+        if len(candidates) == 1:
+            coin_id = candidates[0]
+        else:
             try:
-                response = await client.get("https://api.coingecko.com/api/v3/coins/list")
-                response.raise_for_status()
-                cache.coingecko_list = response.json()
-                cache.coingecko_list_last_updated = time()
-            except Exception as e:
-                logger.warning(f"Failed to fetch CoinGecko coin list: {str(e)}")
-                return None
+                coin_id = await cls._pick_by_market_cap(client, candidates)
+            except FETCH_ERRORS as e:
+                # Not cached, so the next lookup tries to resolve it properly again
+                logger.warning("CoinGecko could not rank the coins listed as %s: %s", symbol, e)
+                return candidates[0]
+        cache.coin_ids[symbol] = coin_id
+        return coin_id
 
-        for coin in cache.coingecko_list:
-            if coin["symbol"].lower() == symbol:
-                cache.coin_ids[symbol] = coin["id"]
-                return coin["id"]
-        return None
+    @classmethod
+    async def _pick_by_market_cap(cls, client: httpx.AsyncClient, ids: List[str]) -> str:
+        """Resolves a symbol shared by several coins to the one with the largest market cap;
+        the earliest listed id wins when caps are equal or unknown"""
+        url = httpx.URL(cls.SIMPLE_PRICE_URL,
+                        params={"ids": ",".join(ids), "vs_currencies": "usd", "include_market_cap": "true"})
+        response = await cls._get(client, str(url))
+        response.raise_for_status()
+        data = cls._json(response)
+        return max(ids, key=lambda coin_id: data.get(coin_id, {}).get("usd_market_cap") or 0)
 
     @classmethod
     def _normalize_currency(cls, currency: str) -> str:
-        return "usd" if currency.upper() in {"USDT", "USDC"} else currency.lower()
+        return "usd" if currency in {"USDT", "USDC"} else currency.lower()
+
+    @classmethod
+    async def fetch_batch(cls, client: httpx.AsyncClient, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        """Prices several (coin id, vs currency) pairs with one simple/price call.
+        The endpoint answers every id against every currency; only the requested pairs are kept."""
+        ids = sorted({coin_id for coin_id, _ in keys})
+        currencies = sorted({currency for _, currency in keys})
+        url = httpx.URL(cls.SIMPLE_PRICE_URL,
+                        params={"ids": ",".join(ids), "vs_currencies": ",".join(currencies)})
+        response = await cls._get(client, str(url))
+        response.raise_for_status()
+        data = cls._json(response)
+
+        results: Dict[Tuple[str, str], float] = {}
+        for coin_id, currency in keys:
+            price = data.get(coin_id, {}).get(currency)
+            if price is not None:
+                results[(coin_id, currency)] = float(price)
+        return results
 
     @classmethod
     async def fetch_price(cls, client: httpx.AsyncClient, base: str, quote: str) -> Optional[PriceResult]:
@@ -277,15 +846,11 @@ class CoinGeckoExchange(ExchangeBase):
             quote_currency = cls._normalize_currency(quote)
             
             if base_id:
-                url = f"https://api.coingecko.com/api/v3/simple/price?ids={base_id}&vs_currencies={quote_currency}"
-                response = await client.get(url)
-                response.raise_for_status()
-                data = response.json()
-                
-                if base_id in data and quote_currency in data[base_id]:
+                price = await coingecko_batcher.get(client, (base_id, quote_currency))
+                if price is not None:
                     return PriceResult(
                         source=cls.NAME,
-                        price=float(data[base_id][quote_currency]),
+                        price=price,
                         base_asset=base,
                         quote_asset=quote
                     )
@@ -294,27 +859,23 @@ class CoinGeckoExchange(ExchangeBase):
             quote_id = await cls.fetch_coin_id(client, quote)
             if quote_id:
                 base_currency = cls._normalize_currency(base)
-                url = f"https://api.coingecko.com/api/v3/simple/price?ids={quote_id}&vs_currencies={base_currency}"
-                response = await client.get(url)
-                response.raise_for_status()
-                data = response.json()
-                
-                if quote_id in data and base_currency in data[quote_id]:
-                    inverted_price = float(data[quote_id][base_currency])
-                    if inverted_price != 0:
-                        return PriceResult(
-                            source=cls.NAME,
-                            price=float(Decimal(1) / Decimal(inverted_price)),
-                            inverted=True,
-                            original_price=inverted_price,
-                            base_asset=base,
-                            quote_asset=quote
-                        )
+                inverted_price = await coingecko_batcher.get(client, (quote_id, base_currency))
+                if inverted_price:
+                    return PriceResult(
+                        source=cls.NAME,
+                        price=1.0 / inverted_price,
+                        inverted=True,
+                        original_price=inverted_price,
+                        base_asset=base,
+                        quote_asset=quote
+                    )
             return None
-        except Exception as e:
-            logger.warning(f"CoinGecko error for {base}/{quote}: {str(e)}")
+        except FETCH_ERRORS as e:
+            logger.warning("CoinGecko error for %s/%s: %s", base, quote, e)
             return None
 
+coingecko_batcher = Coalescer(CoinGeckoExchange.fetch_batch)
+
 # === Exchange Registry ===
 EXCHANGES = [
     BinanceExchange,
@@ -327,74 +888,210 @@ EXCHANGES = [
 
 EXCHANGES.sort(key=lambda x: x.PRIORITY)
 
+# CoinGecko is only a fallback; split it out once instead of filtering on every request
+PRIMARY_EXCHANGES = tuple(e for e in EXCHANGES if e is not CoinGeckoExchange)
+FALLBACK_EXCHANGE = CoinGeckoExchange if CoinGeckoExchange in EXCHANGES else None
+EXCHANGE_BY_NAME: Dict[str, type] = {e.NAME: e for e in EXCHANGES}
+
 # === Price Service ===
 class PriceService:
     @staticmethod
-    async def get_direct_price(base: str, quote: str) -> List[PriceResult]:
-        results = []
-        async with httpx.AsyncClient(timeout=config.HTTP_TIMEOUT) as client:
-            # First try all exchanges except CoinGecko
-            for exchange in [e for e in EXCHANGES if e.NAME != "coingecko"]:
-                cached = cache.get_price(exchange.NAME, base, quote)
-                if cached:
-                    results.append(cached)
-                    continue
+    async def _fetch_and_cache(client: httpx.AsyncClient, exchange, base: str, quote: str) -> Optional[PriceResult]:
+        """Fetches a price from one exchange and records the outcome in the cache"""
+        try:
+            result = await exchange.fetch_price(client, base, quote)
+        except ThrottleTimeout as e:
+            # Says nothing about the exchange: neither its breaker nor the shared failure marker hears of it
+            logger.warning("Skipped %s for %s/%s: %s", exchange.NAME, base, quote, e)
+            return None
+        except Exception as e:
+            logger.error("Error fetching from %s: %s", exchange.NAME, e)
+            result = None
+
+        if result:
+            cache.close_circuit(exchange.NAME, base, quote)
+            cache.set_price(result)
+            await shared_cache.set_price(result)
+        elif cache.record_failure(exchange.NAME, base, quote):
+            await shared_cache.cache_failure(exchange.NAME, base, quote)
+        return result
+
+    @staticmethod
+    async def _fetch_once(client: httpx.AsyncClient, exchange, base: str, quote: str) -> Optional[PriceResult]:
+        """_fetch_and_cache, joining the request already in progress for the same exchange and pair"""
+        key = (exchange.NAME, base, quote)
+        task = cache.fetches_in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(PriceService._fetch_and_cache(client, exchange, base, quote))
+            cache.fetches_in_flight[key] = task
+            task.add_done_callback(lambda _: cache.fetches_in_flight.pop(key, None))
+        # Shielded so a caller that gives up (e.g. the MIN_SOURCES early exit) leaves it running for the others
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def _load_shared(slots: List[Optional[PriceResult]], to_fetch: list, base: str, quote: str) -> list:
+        """Fills slots from the shared store and returns the entries still missing, leaving out
+        sources another worker has recently seen fail. Hits are kept in the local cache too."""
+        if not shared_cache.enabled or not to_fetch:
+            return to_fetch
+        shared, failed = await shared_cache.get_many([exchange.NAME for _, exchange in to_fetch], base, quote)
+        missing = []
+        for (index, exchange), result, recently_failed in zip(to_fetch, shared, failed):
+            if result:
+                cache.set_price(result)
+                slots[index] = result
+            elif not recently_failed:
+                missing.append((index, exchange))
+        return missing
+
+    @staticmethod
+    async def _fetch_missing(client: httpx.AsyncClient, base: str, quote: str, slots: List[Optional[PriceResult]],
+                             to_fetch: list, min_sources: int) -> None:
+        """Fetches the (slot index, exchange) entries, stopping once min_sources slots hold a price.
+        Only as many exchanges as are still needed are queried at a time, in priority order; each one
+        that comes back empty is replaced by the next. min_sources=0 queries them all at once."""
+        successes = sum(1 for r in slots if r)
+        waiting = list(to_fetch)
+        tasks: Dict[asyncio.Future, Tuple[int, type]] = {}
 
-                if cache.is_failure_cached(exchange.NAME, base, quote):
-                    logger.info(f"Skipping {exchange.NAME} for {base}/{quote} - recent failure")
+        def launch(count: int) -> None:
+            while count and waiting:
+                index, exchange = waiting.pop(0)
+                # Another request may have claimed the half-open probe since the sources were picked
+                if not cache.start_fetch(exchange.NAME, base, quote):
                     continue
+                task = asyncio.ensure_future(PriceService._fetch_once(client, exchange, base, quote))
+                tasks[task] = (index, exchange)
+                pending.add(task)
+                count -= 1
+
+        pending = set()
+        launch(min_sources - successes if min_sources else len(waiting))
+        try:
+            while pending and not (min_sources and successes >= min_sources):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index, exchange = tasks[task]
+                    if task.exception():
+                        logger.error("Error fetching from %s: %s", exchange.NAME, task.exception())
+                    elif task.result():
+                        slots[index] = task.result()
+                        successes += 1
+                        continue
+                    launch(1)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def get_direct_price(client: httpx.AsyncClient, base: str, quote: str, refresh: bool = False,
+                               min_sources: Optional[int] = None, source: Optional[str] = None) -> List[PriceResult]:
+        """Collects prices for a pair; refresh=True re-fetches the exchanges it has cached prices from
+        (used by the refreshers). Stops after min_sources prices (default MIN_SOURCES, 0 = every
+        exchange); a source name queries only that exchange. Concurrent callers share each
+        exchange's fetch via _fetch_once."""
+        if min_sources is None:
+            min_sources = config.MIN_SOURCES
+        now = time()
+        # One slot per exchange keeps the results in priority order
+        slots: List[Optional[PriceResult]] = []
+        to_fetch = []
+        stale = False
+
+        # A pinned source is the only exchange asked; otherwise try all exchanges except CoinGecko.
+        # A refresh only renews what is being served for the pair, not every exchange.
+        if source:
+            exchanges = (EXCHANGE_BY_NAME[source],)
+        elif refresh:
+            exchanges = tuple(e for e in PRIMARY_EXCHANGES if cache.get_price(e.NAME, base, quote))
+        else:
+            exchanges = PRIMARY_EXCHANGES
+        for exchange in exchanges:
+            cached = None if refresh else cache.get_price(exchange.NAME, base, quote)
+            if cached:
+                slots.append(cached)
+                stale = stale or cached.remaining(now) <= 0
+                continue
 
-                try:
-                    result = await exchange.fetch_price(client, base, quote)
+            if cache.is_circuit_open(exchange.NAME, base, quote):
+                logger.debug("Skipping %s for %s/%s - circuit open", exchange.NAME, base, quote)
+                continue
+
+            to_fetch.append((len(slots), exchange))
+            slots.append(None)
+
+        def satisfied() -> bool:
+            return bool(min_sources) and sum(1 for r in slots if r) >= min_sources
+
+        # Query uncached exchanges, unless cached prices already satisfy min_sources
+        if to_fetch and not satisfied() and not refresh:
+            # Another worker may already have fetched these; reading them needs no lock
+            to_fetch = await PriceService._load_shared(slots, to_fetch, base, quote)
+        if to_fetch and not satisfied():
+            async with shared_cache.single_flight(f"{base}:{quote}"):
+                if not refresh:
+                    # The lock holder we may have waited for has probably fetched them by now
+                    to_fetch = await PriceService._load_shared(slots, to_fetch, base, quote)
+                if to_fetch and not satisfied():
+                    await PriceService._fetch_missing(client, base, quote, slots, to_fetch, min_sources)
+
+        results = [r for r in slots if r]
+
+        # Only try CoinGecko if we have no results from other exchanges
+        if not results and not source:
+            coingecko = FALLBACK_EXCHANGE
+            if coingecko and (not refresh or cache.get_price(coingecko.NAME, base, quote)):
+                cached = None if refresh else cache.get_price(coingecko.NAME, base, quote)
+                if not cached and not refresh:
+                    cached = await shared_cache.get_price(coingecko.NAME, base, quote)
+                    if cached:
+                        cache.set_price(cached)
+                if cached:
+                    results.append(cached)
+                    stale = stale or cached.remaining(now) <= 0
+                elif cache.start_fetch(coingecko.NAME, base, quote):
+                    result = await PriceService._fetch_once(client, coingecko, base, quote)
                     if result:
-                        cache.set_price(result)
                         results.append(result)
-                    else:
-                        cache.cache_failure(exchange.NAME, base, quote)
-                except Exception as e:
-                    logger.error(f"Error fetching from {exchange.NAME}: {str(e)}")
-                    cache.cache_failure(exchange.NAME, base, quote)
-
-            # Only try CoinGecko if we have no results from other exchanges
-            if not results:
-                coingecko = next((e for e in EXCHANGES if e.NAME == "coingecko"), None)
-                if coingecko:
-                    cached = cache.get_price(coingecko.NAME, base, quote)
-                    if cached:
-                        results.append(cached)
-                    elif not cache.is_failure_cached(coingecko.NAME, base, quote):
-                        try:
-                            result = await coingecko.fetch_price(client, base, quote)
-                            if result:
-                                cache.set_price(result)
-                                results.append(result)
-                            else:
-                                cache.cache_failure(coingecko.NAME, base, quote)
-                        except Exception as e:
-                            logger.error(f"Error fetching from CoinGecko: {str(e)}")
-                            cache.cache_failure(coingecko.NAME, base, quote)
 
+        # Expired prices within the grace period are served as-is and refreshed behind the response
+        if stale:
+            PriceService._schedule_refresh(client, base, quote)
         return results
 
     @staticmethod
-    async def get_derived_price(base: str, quote: str, intermediate: str = None) -> Optional[DerivedPriceResult]:
-        intermediate = intermediate or config.INTERMEDIATE_SYMBOL
-        if base.upper() == intermediate or quote.upper() == intermediate:
-            return None
+    def _schedule_refresh(client: httpx.AsyncClient, base: str, quote: str) -> None:
+        """Re-fetches a pair in the background unless a refresh for it is already running"""
+        pair = (base, quote)
+        if pair in cache.refreshing:
+            return
 
-        # Get first leg: BASE/INTERMEDIATE (e.g. RTM/USDT)
-        first_leg = await PriceService.get_direct_price(base, intermediate)
-        if not first_leg:
+        def _done(task: asyncio.Task) -> None:
+            cache.refreshing.pop(pair, None)
+            if not task.cancelled() and task.exception():
+                logger.error("Background refresh failed for %s/%s: %s", base, quote, task.exception())
+
+        task = asyncio.ensure_future(PriceService.get_direct_price(client, base, quote, refresh=True, min_sources=0))
+        cache.refreshing[pair] = task
+        task.add_done_callback(_done)
+
+    @staticmethod
+    async def get_derived_price(client: httpx.AsyncClient, base: str, quote: str, intermediate: str = None) -> Optional[DerivedPriceResult]:
+        intermediate = intermediate or config.INTERMEDIATE_SYMBOL
+        if base == intermediate or quote == intermediate:
             return None
 
-        # Get second leg: QUOTE/INTERMEDIATE (e.g. IDEX/USDT)
-        second_leg = await PriceService.get_direct_price(quote, intermediate)
-        if not second_leg:
+        # Fetch both legs concurrently: BASE/INTERMEDIATE (e.g. RTM/USDT) and QUOTE/INTERMEDIATE (e.g. IDEX/USDT)
+        first_leg, second_leg = await asyncio.gather(
+            PriceService.get_direct_price(client, base, intermediate),
+            PriceService.get_direct_price(client, quote, intermediate)
+        )
+        if not first_leg or not second_leg:
             return None
 
         # Use best available prices from each leg
-        best_first = max(first_leg, key=lambda x: x.price)
-        best_second = max(second_leg, key=lambda x: x.price)
+        best_first = best_price(first_leg)
+        best_second = best_price(second_leg)
 
         # Calculate derived price: (BASE/INTERMEDIATE) / (QUOTE/INTERMEDIATE)
         if best_second.price != 0:
@@ -420,89 +1117,226 @@ class PriceService:
             ]
         )
 
+    @staticmethod
+    async def _resolve_prices(client: httpx.AsyncClient, base: str, quote: str, source: Optional[str],
+                              intermediate: Optional[str], all_sources: bool) -> List[PriceResult]:
+        # A pinned source must not be cut off by the early exit
+        min_sources = 0 if source or all_sources else None
+        prices = await PriceService.get_direct_price(client, base, quote, min_sources=min_sources, source=source)
+
+        # If no direct prices and no source specified, try derived price
+        if not prices and not source:
+            derived = await PriceService.get_derived_price(client, base, quote, intermediate)
+            if derived:
+                cache.set_price(derived)
+                prices.append(derived)
+        return prices
+
+    @staticmethod
+    async def get_prices(client: httpx.AsyncClient, base: str, quote: str, source: Optional[str] = None,
+                         intermediate: Optional[str] = None, all_sources: bool = False) -> List[PriceResult]:
+        """Resolves the prices for a /price request; all_sources=True asks every exchange instead of
+        stopping at MIN_SOURCES. Identical concurrent requests share one in-flight lookup instead of
+        each fanning out to the exchanges."""
+        key = (base, quote, source, intermediate, all_sources)
+        task = cache.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(
+                PriceService._resolve_prices(client, base, quote, source, intermediate, all_sources)
+            )
+            cache.in_flight[key] = task
+            task.add_done_callback(lambda _: cache.in_flight.pop(key, None))
+        # Shielded so one caller disconnecting does not cancel the lookup for the others
+        return list(await asyncio.shield(task))
+
 # === API Endpoints ===
-app = FastAPI()
+async def refresh_hot_pairs(client: httpx.AsyncClient) -> None:
+    """Re-fetches recently requested pairs before their cached prices expire. Each pair is
+    renewed once per interval, with the pairs spread evenly over it rather than all at once."""
+    interval = config.CACHE_TTL * 0.8
+    while True:
+        pairs = cache.get_hot_pairs()
+        if not pairs:
+            await asyncio.sleep(interval)
+            continue
+        for base, quote in pairs:
+            PriceService._schedule_refresh(client, base, quote)
+            await asyncio.sleep(interval / len(pairs))
+
+async def expire_caches() -> None:
+    """Frees expired cache entries even for pairs nobody requests any more"""
+    while True:
+        await asyncio.sleep(config.CACHE_TTL / 2)
+        cache.expire()
+
+async def refresh_coingecko_list(client: httpx.AsyncClient) -> None:
+    """Keeps the CoinGecko coin list current so no request pays for the download"""
+    while True:
+        await CoinGeckoExchange.refresh_coin_list(client)
+        await asyncio.sleep(config.COINGECKO_LIST_TTL * 0.9)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    log_listener.start()
+    # One pooled client for the whole process keeps upstream connections alive between requests;
+    # HTTP/2 lets concurrent fetches to the same exchange share a single connection
+    app.state.http_client = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(config.HTTP_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE
+        )
+    )
+    shared_cache.connect(config.REDIS_URL)
+    background_tasks = [
+        asyncio.create_task(refresh_hot_pairs(app.state.http_client)),
+        asyncio.create_task(refresh_coingecko_list(app.state.http_client)),
+        asyncio.create_task(expire_caches()),
+    ]
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await app.state.http_client.aclose()
+        await shared_cache.close()
+        log_listener.stop()  # Flushes whatever is still queued
+
+# Per-client limit on /price so one caller cannot exhaust the exchanges' rate limits for everyone
+limiter = Limiter(key_func=get_remote_address)
+class OrjsonResponse(Response):
+    """JSON response encoded with orjson; pre-encoded bytes are sent as-is"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
+
+app = FastAPI(lifespan=lifespan, default_response_class=OrjsonResponse)
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+# Scalar response fields, keyed by name: (best price, base, quote, now) -> value
+FIELD_EXTRACTORS: Dict[str, Callable[[PriceResult, str, str, float], object]] = {
+    "symbol": lambda best, base, quote, now: base,
+    "quote": lambda best, base, quote, now: quote,
+    "price": lambda best, base, quote, now: best.price,
+    "source": lambda best, base, quote, now: best.source,
+    "inverted": lambda best, base, quote, now: best.inverted,
+    "expires_in": lambda best, base, quote, now: best.remaining(now),
+    "expires_at": lambda best, base, quote, now: best.expires_at_iso(now),
+}
 
 @app.get("/price")
+@limiter.limit(config.CLIENT_RATE_LIMIT)
 async def get_price(
+    request: Request,
     token: str = Query(..., description="The base cryptocurrency symbol"),
     quote: str = Query(config.DEFAULT_QUOTE, description="The quote currency symbol"),
     source: str = Query(None, description="Specific exchange to use"),
     intermediate: str = Query(None, description="Intermediate currency for derived prices"),
-    fields: str = Query(None, description="Comma-separated fields to return")
+    fields: str = Query(None, description="Comma-separated fields to return"),
+    fanout: str = Query(None, description="'all' queries every exchange instead of the first MIN_SOURCES to answer")
 ):
+    # Normalize once here; everything downstream assumes uppercase symbols
     base = token.upper()
     quote = quote.upper()
+    intermediate = intermediate.upper() if intermediate else None
 
     # Validate source if specified
     if source:
         source = source.lower()
-        if source not in [e.NAME for e in EXCHANGES]:
+        if source not in EXCHANGE_BY_NAME:
             raise HTTPException(status_code=400, detail="Invalid source specified")
 
-    # Get prices
-    prices = await PriceService.get_direct_price(base, quote)
-    
-    # If no direct prices and no source specified, try derived price
-    if not prices and not source:
-        derived = await PriceService.get_derived_price(base, quote, intermediate)
-        if derived:
-            cache.set_price(derived)
-            prices.append(derived)
-
-    # Filter by source if specified
-    if source:
-        prices = [p for p in prices if p.source == source]
-        if not prices:
-            raise HTTPException(
-                status_code=404,
-                detail=f"No data found for {source} on {base}/{quote}"
-            )
+    if fanout and fanout.lower() != "all":
+        raise HTTPException(status_code=400, detail="Invalid fanout specified")
+    all_sources = bool(fanout)
+
+    # Popular pairs are answered straight from the encoded body while it is fresh; a miss at least
+    # every RESPONSE_CACHE_TTL keeps the pair tracked as hot below
+    render_key = (base, quote, source, intermediate, all_sources)
+    if not fields:
+        body = cache.rendered.get(render_key)
+        if body is not None:
+            return OrjsonResponse(body)
+
+    client = request.app.state.http_client
+
+    prices = await PriceService.get_prices(client, base, quote, source, intermediate, all_sources)
+
+    if source and not prices:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No data found for {source} on {base}/{quote}"
+        )
 
     if not prices:
         raise HTTPException(status_code=404, detail="No price data available")
 
-    # Prepare response
-    best_price = max(prices, key=lambda x: x.price)
+    # Keep the pairs behind this answer warm for the next request
+    for p in prices:
+        if isinstance(p, DerivedPriceResult):
+            for c in p.components:
+                cache.track_hot_pair(c.base_asset, c.quote_asset)
+        else:
+            cache.track_hot_pair(base, quote)
+
+    # Prepare response; every expiry below is computed against the same clock reading
+    best = best_price(prices)
+    now = time()
+
+    # A single scalar field (e.g. fields=price for spreadsheets) needs none of the full response
+    extractor = FIELD_EXTRACTORS.get(fields.strip()) if fields else None
+    if extractor:
+        return PlainTextResponse(str(extractor(best, base, quote, now)))
     response = {
         "symbol": base,
         "quote": quote,
-        "price": best_price.price,
-        "source": best_price.source,
-        "inverted": best_price.inverted,
-        "expires_in": best_price.expires_in,
-        "expires_at": best_price.expires_at.isoformat(),
+        "price": best.price,
+        "source": best.source,
+        "inverted": best.inverted,
+        "expires_in": best.remaining(now),
+        "expires_at": best.expires_at_iso(now),
         "sources": [{
             "source": p.source,
             "price": p.price,
             "inverted": p.inverted,
-            "expires_in": p.expires_in,
-            "expires_at": p.expires_at.isoformat()
+            "expires_in": p.remaining(now),
+            "expires_at": p.expires_at_iso(now)
         } for p in prices]
     }
 
     # Add components if derived price
-    if isinstance(best_price, DerivedPriceResult):
+    if isinstance(best, DerivedPriceResult):
         response["components"] = [{
             "pair": c.pair,
             "source": c.source,
             "price": c.price,
             "inverted": c.inverted,
-            "expires_in": c.expires_in,
-            "expires_at": c.expires_at.isoformat()
-        } for c in best_price.components]
+            "expires_in": c.remaining(now),
+            "expires_at": c.expires_at_iso(now)
+        } for c in best.components]
 
     # Filter fields if requested
     if fields:
         field_list = [f.strip() for f in fields.split(",")]
         filtered = {k: v for k, v in response.items() if k in field_list}
-        return JSONResponse(filtered) if len(filtered) > 1 else PlainTextResponse(str(next(iter(filtered.values()))))
+        if len(filtered) > 1:
+            return OrjsonResponse(filtered)
+        return PlainTextResponse(str(next(iter(filtered.values()))))
 
-    return JSONResponse(response)
+    body = orjson.dumps(response)
+    cache.rendered[render_key] = body
+    return OrjsonResponse(body)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    # Returned directly so orjson encodes the datetime itself, skipping FastAPI's jsonable_encoder pass
+    return OrjsonResponse({"status": "healthy", "timestamp": datetime.now()})
 
 if __name__ == "__main__":
     import uvicorn
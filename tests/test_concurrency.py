@@ -0,0 +1,276 @@
+import asyncio
+from time import monotonic, time
+
+import fakeredis.aioredis
+import httpx
+import orjson
+import pytest
+
+import app
+
+TICKERS = {"BTCUSDT": 60000.0, "ETHUSDT": 3000.0}
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Every test gets empty caches, throttles and batchers bound to its own event loop"""
+    monkeypatch.setattr(app, "cache", app.PriceCache())
+    monkeypatch.setattr(app.ExchangeBase, "_throttles", {})
+    monkeypatch.setattr(app, "binance_batcher", app.Coalescer(app.BinanceExchange.fetch_batch))
+    monkeypatch.setattr(app, "coingecko_batcher", app.Coalescer(app.CoinGeckoExchange.fetch_batch))
+    monkeypatch.setattr(app.config, "MIN_SOURCES", 2)
+    monkeypatch.setattr(app.config, "FAILURE_TTL", 600)
+    monkeypatch.setattr(app.config, "BREAKER_THRESHOLD", 3)
+    monkeypatch.setattr(app.shared_cache, "redis", None)
+
+
+def ticker_handler(sent: list):
+    """Answers Binance-style tickers for every exchange; unknown symbols get a 400"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        params = request.url.params
+        if "symbols" in params:
+            symbols = orjson.loads(params["symbols"])
+            if any(symbol not in TICKERS for symbol in symbols):
+                return httpx.Response(400, json={"code": -1121, "msg": "Invalid symbol."})
+            return httpx.Response(200, json=[{"symbol": s, "price": str(TICKERS[s])} for s in symbols])
+        symbol = params.get("symbol")
+        if symbol in TICKERS:
+            return httpx.Response(200, json={"symbol": symbol, "price": str(TICKERS[symbol])})
+        if request.url.host == "www.okx.com":
+            return httpx.Response(200, json={"data": [{"last": "59999"}]})
+        if request.url.host == "api.kraken.com":
+            return httpx.Response(200, json={"result": {"XXBTZUSD": {"c": ["59998", "1"]}}})
+        return httpx.Response(400, json={"code": -1121, "msg": "Invalid symbol."})
+    return handler
+
+
+def test_binance_batch_falls_back_to_single_requests_on_400():
+    sent = []
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(ticker_handler(sent))) as client:
+            return await asyncio.gather(
+                app.BinanceExchange.fetch_price(client, "BTC", "USDT"),
+                app.BinanceExchange.fetch_price(client, "ETH", "USDT"),
+                app.BinanceExchange.fetch_price(client, "ZZZ", "USDT"),
+            )
+
+    btc, eth, unknown = asyncio.run(run())
+
+    assert (btc.price, eth.price, unknown) == (60000.0, 3000.0, None)
+    # One rejected batch, then one request per pair
+    assert "symbols" in sent[0].url.params
+    assert sorted(r.url.params["symbol"] for r in sent[1:]) == ["BTCUSDT", "ETHUSDT", "ZZZUSDT"]
+
+
+def test_half_open_probe_is_sent_once_the_source_is_queried():
+    sent = []
+    for _ in range(app.config.BREAKER_THRESHOLD):
+        app.cache.record_failure("kraken", "BTC", "USDT")
+    breaker = app.cache.breakers[("kraken", "BTC", "USDT")]
+    breaker.opened_at = monotonic() - app.config.FAILURE_TTL - 1  # Cooldown over
+    cooled_down_at = breaker.opened_at
+
+    async def run(**kwargs):
+        async with httpx.AsyncClient(transport=httpx.MockTransport(ticker_handler(sent))) as client:
+            return await app.PriceService.get_direct_price(client, "BTC", "USDT", **kwargs)
+
+    # Binance and OKX satisfy MIN_SOURCES, so Kraken is not asked and keeps its probe
+    assert [p.source for p in asyncio.run(run())] == ["binance", "okx"]
+    assert not any(r.url.host == "api.kraken.com" for r in sent)
+    assert breaker.opened_at == cooled_down_at
+
+    # Asking every exchange sends the probe, and its success closes the circuit
+    prices = asyncio.run(run(min_sources=0))
+    assert "kraken" in [p.source for p in prices]
+    assert sum(r.url.host == "api.kraken.com" for r in sent) == 1
+    assert ("kraken", "BTC", "USDT") not in app.cache.breakers
+
+
+def test_hedge_loser_sends_no_request(monkeypatch):
+    monkeypatch.setattr(app.CoinGeckoExchange, "HEDGE_DELAY", 0.1)
+    app.cache.coingecko_symbol_index = {"btc": ["bitcoin"]}
+    app.cache.coingecko_list_last_updated = monotonic()
+    sent = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        await asyncio.sleep(0.3)  # Slow enough for the hedge to fire
+        return httpx.Response(200, json={"bitcoin": {"usd": 60000.0}})
+
+    async def run():
+        # One token now and the next in 0.5s: the hedge is still waiting for it when the first request answers
+        _, limiter = app.CoinGeckoExchange._throttle()
+        limiter.tokens, limiter.rate, limiter.updated = 1, 2, monotonic()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            prices = await app.PriceService.get_direct_price(client, "BTC", "USDT", source="coingecko")
+            await asyncio.sleep(0.5)  # Time for a leaked hedge to go out
+            return prices
+
+    assert [p.price for p in asyncio.run(run())] == [60000.0]
+    assert len(sent) == 1
+
+
+def test_failed_probes_double_the_cooldown_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(app.config, "BREAKER_MAX_COOLDOWN", 2000)
+    for _ in range(app.config.BREAKER_THRESHOLD):
+        app.cache.record_failure("kraken", "FOO", "USDT")
+    breaker = app.cache.breakers[("kraken", "FOO", "USDT")]
+
+    cooldowns = [breaker.cooldown]
+    for _ in range(3):
+        breaker.opened_at = monotonic() - breaker.cooldown  # Cooldown over
+        assert app.cache.start_fetch("kraken", "FOO", "USDT")
+        assert app.cache.record_failure("kraken", "FOO", "USDT")
+        cooldowns.append(breaker.cooldown)
+
+    assert cooldowns == [600, 1200, 2000, 2000]
+    assert app.cache.is_circuit_open("kraken", "FOO", "USDT")
+
+
+def test_throttle_timeout_does_not_count_against_the_source(monkeypatch):
+    monkeypatch.setattr(app.KrakenExchange, "TIMEOUT", 0.05)
+    sent = []
+
+    async def run():
+        # No token for the next 10 seconds
+        _, limiter = app.KrakenExchange._throttle()
+        limiter.tokens, limiter.rate, limiter.updated = 0, 0.1, monotonic()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(ticker_handler(sent))) as client:
+            return [await app.PriceService.get_direct_price(client, "BTC", "USDT", source="kraken")
+                    for _ in range(app.config.BREAKER_THRESHOLD + 1)]
+
+    assert asyncio.run(run()) == [[]] * (app.config.BREAKER_THRESHOLD + 1)
+    assert sent == []
+    assert not app.cache.breakers
+
+
+def test_successful_fetch_clears_the_shared_failure_marker(monkeypatch):
+    redis = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(app.shared_cache, "redis", redis)
+    failure_key = app.SharedPriceStore._failure_key("kraken", "BTC", "USDT")
+    sent = []
+
+    async def run():
+        await app.shared_cache.cache_failure("kraken", "BTC", "USDT")
+        assert await redis.exists(failure_key)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(ticker_handler(sent))) as client:
+            # The half-open probe succeeds
+            await app.PriceService.get_direct_price(client, "BTC", "USDT", refresh=True, source="kraken")
+        return await app.shared_cache.get_many(["kraken"], "BTC", "USDT")
+
+    (price,), (recently_failed,) = asyncio.run(run())
+    assert price.price == 59998.0
+    assert not recently_failed
+
+
+def test_coin_list_download_is_shared_and_not_retried_after_failure():
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request)
+        return httpx.Response(429)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            started = monotonic()
+            prices = await asyncio.gather(
+                *(app.CoinGeckoExchange.fetch_price(client, "BTC", "USDT") for _ in range(10))
+            )
+            # Still within COINGECKO_LIST_RETRY of the failed download
+            prices.append(await app.CoinGeckoExchange.fetch_price(client, "ETH", "USDT"))
+            return prices, monotonic() - started
+
+    prices, elapsed = asyncio.run(run())
+    assert prices == [None] * 11
+    assert [r.url.path for r in sent] == ["/api/v3/coins/list"]
+    assert elapsed < 1
+
+
+def test_shared_store_keeps_plain_json_fields(monkeypatch):
+    redis = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(app.shared_cache, "redis", redis)
+    price = app.PriceResult(source="kraken", price=0.5, base_asset="FOO", quote_asset="BTC",
+                            inverted=True, original_price=2.0)
+
+    async def run():
+        await app.shared_cache.set_price(price)
+        stored = await redis.get(app.SharedPriceStore._key("kraken", "FOO", "BTC"))
+        loaded = await app.shared_cache.get_price("kraken", "FOO", "BTC")
+        await redis.set(app.SharedPriceStore._key("kraken", "BAR", "BTC"), b"\x80\x04not json")
+        unreadable = await app.shared_cache.get_price("kraken", "BAR", "BTC")
+        return stored, loaded, unreadable
+
+    stored, loaded, unreadable = asyncio.run(run())
+    assert orjson.loads(stored)["original_price"] == 2.0
+    assert loaded == price
+    assert unreadable is None
+
+
+def test_shared_hit_takes_no_lock_and_is_kept_locally(monkeypatch):
+    redis = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(app.shared_cache, "redis", redis)
+    sent, commands = [], []
+
+    async def run():
+        for source in ("binance", "okx"):
+            await app.shared_cache.set_price(app.PriceResult(source, 60000.0, "BTC", "USDT"))
+        execute_command = redis.execute_command
+
+        async def counting(*args, **kwargs):
+            commands.append(args[0])
+            return await execute_command(*args, **kwargs)
+
+        monkeypatch.setattr(redis, "execute_command", counting)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(ticker_handler(sent))) as client:
+            first = await app.PriceService.get_direct_price(client, "BTC", "USDT")
+            second = await app.PriceService.get_direct_price(client, "BTC", "USDT")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert [p.source for p in first] == [p.source for p in second] == ["binance", "okx"]
+    assert sent == []
+    assert commands == ["MGET"]
+
+
+def test_waiting_worker_uses_the_prices_of_the_lock_holder(monkeypatch):
+    redis = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(app.shared_cache, "redis", redis)
+    sent = []
+
+    async def other_worker():
+        await asyncio.sleep(0.1)
+        for source in ("binance", "okx"):
+            await app.shared_cache.set_price(app.PriceResult(source, 60000.0, "BTC", "USDT"))
+        await redis.delete("px:lock:BTC:USDT")
+
+    async def run():
+        await redis.set("px:lock:BTC:USDT", "other", ex=app.config.SINGLE_FLIGHT_TTL)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(ticker_handler(sent))) as client:
+            prices, _ = await asyncio.gather(
+                app.PriceService.get_direct_price(client, "BTC", "USDT"), other_worker()
+            )
+        return prices
+
+    assert [p.source for p in asyncio.run(run())] == ["binance", "okx"]
+    assert sent == []
+
+
+def test_stale_prices_are_served_and_refreshed_behind_the_response():
+    expired = time() - app.config.CACHE_TTL - 1
+    for source in ("binance", "okx"):
+        app.cache.set_price(app.PriceResult(source, 1.0, "BTC", "USDT", timestamp=expired))
+    sent = []
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(ticker_handler(sent))) as client:
+            served = await app.PriceService.get_direct_price(client, "BTC", "USDT")
+            assert sent == []  # Answered from the stale entries without waiting
+            await asyncio.gather(*app.cache.refreshing.values())
+        return served
+
+    served = asyncio.run(run())
+    assert [p.price for p in served] == [1.0, 1.0]
+    assert sorted(r.url.host for r in sent) == ["api.binance.com", "www.okx.com"]
+    assert app.cache.get_price("binance", "BTC", "USDT").price == 60000.0